@@ -21,10 +21,13 @@ from the console.
 
 move: Apply one move to the given model, and print any error message
 to the console.
+ConsoleAnimator: Draws frames of a model to a terminal, redrawing only the
+rows that changed since the last frame.
 """
 
-from TOAHModel import TOAHModel, Cheese, IllegalMoveError
+from TOAHModel import TOAHModel, TOAHRenderer, Cheese, IllegalMoveError
 import random
+import sys
 
 
 def move(model: TOAHModel, origin: int, dest: int):
@@ -75,6 +78,81 @@ def is_move(query: str) -> bool:
     return False
 
 
+class ConsoleAnimator:
+    """Animates a TOAHModel in a terminal. Each frame moves the cursor to
+    just the rows of the picture that changed since the last frame and
+    redraws those, in a single write, so a frame after one move costs two
+    rows of output however tall the tower is.
+
+    draw - draw a frame of the model as it is now
+    finish - draw a last frame and leave the cursor below the picture
+    """
+
+    #Escape sequences understood by ANSI terminals.
+    _CLEAR = "\x1b[H\x1b[2J"
+    _GOTO = "\x1b[{};1H"
+    _HIDE_CURSOR = "\x1b[?25l"
+    _SHOW_CURSOR = "\x1b[?25h"
+
+    def __init__(self: 'ConsoleAnimator', model: TOAHModel,
+                 out: 'file'=None, redraw_rows: bool=None):
+        """
+        Initialize a ConsoleAnimator for model.
+
+        out - where to write frames, sys.stdout by default
+        redraw_rows - whether to redraw only the changed rows using escape
+                      sequences, which by default is done only if out is a
+                      terminal. Otherwise each frame is printed in full.
+        """
+        self._out = sys.stdout if out is None else out
+        if redraw_rows is None:
+            redraw_rows = self._out.isatty()
+        self._redraw_rows = redraw_rows
+        self._renderer = TOAHRenderer(model)
+        self._shown = None
+
+    def draw(self: 'ConsoleAnimator'):
+        """Draw a frame of the model as it is now.
+
+        >>> import io
+        >>> m = TOAHModel(3)
+        >>> m.fill_first_stool(2)
+        >>> out = io.StringIO()
+        >>> animator = ConsoleAnimator(m, out, redraw_rows=True)
+        >>> animator.draw()
+        >>> m.move(0, 1)
+        >>> start = len(out.getvalue())
+        >>> animator.draw()
+        >>> out.getvalue()[start:].count("\x1b[")
+        3
+        """
+        lines = self._renderer.lines()
+        if not self._redraw_rows:
+            frame = "\n".join(lines) + "\n"
+        elif self._shown is None or len(lines) != len(self._shown):
+            frame = (self._HIDE_CURSOR + self._CLEAR + "\n".join(lines) +
+                     "\n")
+        else:
+            #Unchanged rows are the same string objects as last frame.
+            parts = []
+            for row in range(len(lines)):
+                if lines[row] is not self._shown[row]:
+                    parts.append(self._GOTO.format(row + 1))
+                    parts.append(lines[row])
+            parts.append(self._GOTO.format(len(lines) + 1))
+            frame = "".join(parts)
+        self._shown = lines
+        self._out.write(frame)
+        self._out.flush()
+
+    def finish(self: 'ConsoleAnimator'):
+        """Draw a last frame, and give the cursor back below it."""
+        self.draw()
+        if self._redraw_rows:
+            self._out.write(self._SHOW_CURSOR)
+            self._out.flush()
+
+
 class ConsoleController:
 
     def __init__(self: 'ConsoleController',
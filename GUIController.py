@@ -18,15 +18,17 @@ import pep8
 # You should have received a copy of the GNU General Public License
 # along with this file.  If not, see <http://www.gnu.org/licenses/>.
 """
-GUIController: GUI window for manually solving Anne Hoy's problems.
+GUIController: GUI window for manually solving Anne Hoy's problems, or for
+watching a solution play itself.
 """
 
 
 from TOAHModel import TOAHModel, IllegalMoveError
-from GUIViewables import CheeseView, PlatformView, StoolView
+from GUIViewables import (CheeseView, PlatformView, StoolView,
+                          EffectScheduler, CanvasBatch, ClickDispatcher)
 import tkinter as TI
-import time
 import sys
+import time
 
 
 class GUIController:
@@ -46,71 +48,131 @@ class GUIController:
                        and to scale cheese diameters
         """
 
-        self._model = TOAHModel(number_of_stools)
         self._stools = []
+        # _cheese_views[size] is the CheeseView of that size, so clicks
+        # never search for a view. It also pools the views: a new game
+        # reuses them, hiding any it doesn't need.
+        self._cheese_views = [None]
         self._cheese_to_move = None
-        self._blinking = False
+        self._blinking_cheese = None
+        self._autoplay_moves = None
         self._number_of_stools = number_of_stools
+        self._content_width = content_width
+        self._content_height = content_height
         self.cheese_scale = cheese_scale
 
         self.root = TI.Tk()
+        # Blinking and other timed effects run from the event loop, so
+        # clicks are still handled while they play.
+        self._effects = EffectScheduler(self.root)
         canvas = TI.Canvas(self.root,
                            background="blue",
                            width=content_width, height=content_height)
         canvas.pack(expand=True, fill=TI.BOTH)
+        self._canvas = canvas
+        # Every change to the canvas is saved up and sent in one go per
+        # frame, rectangles are created many at a time, and one binding on
+        # the canvas reports clicks on any of them.
+        self._batch = CanvasBatch(canvas, self._effects)
+        self._dispatcher = ClickDispatcher(canvas)
 
         self.moves_label = TI.Label(self.root)
-        self.show_number_of_moves()
         self.moves_label.pack()
+        self.speed_label = TI.Label(self.root)
+        self.speed_label.pack()
 
-        # the dimensions of a stool are the same as a cheese that's
-        # one size bigger than the biggest of the number_of_cheeses cheeses.
+        # The stools are created first so that the cheeses are drawn over
+        # them. new_game sizes them.
+        indices = iter(self._batch.create_rectangles(number_of_stools))
         for stool_ind in range(number_of_stools):
-            width = self.cheese_scale * (number_of_cheeses + 1)
             x_cent = content_width * (stool_ind + 1) / (number_of_stools + 1.0)
             y_cent = content_height - cheese_scale / 2
-            stool = StoolView(width,
-                              lambda s: self.stoolClicked(s),
+            stool = StoolView(0,
+                              self.stoolClicked,
                               canvas,
                               self.cheese_scale,
                               x_cent,
-                              y_cent)
+                              y_cent,
+                              stool_ind,
+                              next(indices),
+                              self._batch,
+                              self._dispatcher)
             self._stools.append(stool)
 
+        self.new_game(number_of_cheeses)
+
+    def new_game(self: 'GUIController', number_of_cheeses: int):
+        """
+        Start a new game with a tower of number_of_cheeses cheeses on the
+        first stool, reusing the CheeseViews of earlier games.
+        """
+        self.stop_autoplay()
+        self.stop_blinking()
+        self._cheese_to_move = None
+        self._model = TOAHModel(self._number_of_stools)
+
+        # the dimensions of a stool are the same as a cheese that's
+        # one size bigger than the biggest of the number_of_cheeses cheeses.
+        for stool in self._stools:
+            stool.resize(self.cheese_scale * (number_of_cheeses + 1))
+
+        # Create only the cheeses that no earlier game had.
+        missing = number_of_cheeses + 1 - len(self._cheese_views)
+        if missing > 0:
+            indices = iter(self._batch.create_rectangles(missing))
+            for size in range(len(self._cheese_views),
+                              number_of_cheeses + 1):
+                cheese = CheeseView(size,
+                                    self.cheese_scale * size,
+                                    self.cheeseClicked,
+                                    self._canvas,
+                                    self.cheese_scale,
+                                    0,
+                                    0,
+                                    next(indices),
+                                    self._batch,
+                                    self._dispatcher)
+                self._cheese_views.append(cheese)
+
         # Can't use self._model.fill_first_stool because we need to
         # use CheeseView objects instead of just Cheese objects.
         total_size = self.cheese_scale
         for sizeparam in range(1, number_of_cheeses + 1):
             size = (number_of_cheeses + 1 - sizeparam)
-            width = self.cheese_scale * size
-            x_cent = content_width / (number_of_stools + 1.0)
-            y_cent = content_height - cheese_scale / 2 - total_size
-            cheese = CheeseView(size,
-                                width,
-                                lambda c: self.cheeseClicked(c),
-                                canvas,
-                                self.cheese_scale,
-                                x_cent,
-                                y_cent)
+            x_cent = self._content_width / (self._number_of_stools + 1.0)
+            y_cent = (self._content_height - self.cheese_scale / 2 -
+                      total_size)
+            cheese = self._cheese_views[size]
+            cheese.place(x_cent, y_cent)
+            cheese.highlight(False)
+            cheese.show(True)
             self._model.add(0, cheese)
             total_size += self.cheese_scale
+        for cheese in self._cheese_views[number_of_cheeses + 1:]:
+            cheese.show(False)
+
+        self.show_number_of_moves()
+        self.speed_label.config(text='')
+        self._batch.flush()
 
     def cheeseClicked(self: 'GUIController', cheese: 'CheeseView'):
-        """React to cheese being clicked: if not in the middle of blinking
-           then select cheese for moving, or for moving onto.
+        """React to cheese being clicked: stop any blinking, then select
+           cheese for moving, or for moving onto.
 
            cheese - clicked cheese
         """
-        if not self._blinking:
+        self.stop_blinking()
+        if self._autoplay_moves is None:
             self.select_cheese(cheese)
 
     def stoolClicked(self: 'GUIController', stool: 'StoolView'):
-        """React to cheese being clicked: if not in the middle of blinking
-        then select cheese for moving, or for moving onto.
+        """React to stool being clicked: stop any blinking, then select
+        stool for moving onto.
 
-        cheese - clicked cheese
+        stool - clicked stool
         """
-        if not self._blinking:
+        self.stop_blinking()
+        if self._autoplay_moves is None:
             self.select_stool(stool)
 
     def select_cheese(self: 'GUIController', cheese: CheeseView):
@@ -124,9 +186,8 @@ class GUIController:
         clicked_cheese is on.
         """
 
-        stool = self._stools[self._model.cheese_location(cheese)]
-        stool_index = self.stool_index(stool)
-        cheese = self._model.top_cheese(stool_index)
+        stool_index = self._model.cheese_location(cheese)
+        cheese = self.top_cheese(stool_index)
         #print(stool, stool_index, cheese)
         if self._cheese_to_move is None:
             self._cheese_to_move = cheese
@@ -146,12 +207,11 @@ class GUIController:
         self._cheese_to_move is on dest_stool, in which case do nothing.
         """
         if self._cheese_to_move is not None:
-            origin_stool = self._stools[
-                self._model.cheese_location(self._cheese_to_move)]
+            origin_stool_index = self._model.cheese_location(
+                self._cheese_to_move)
             dest_stool_index = self.stool_index(dest_stool)
-            origin_stool_index = self.stool_index(origin_stool)
             if origin_stool_index != dest_stool_index:
-                top_cheese = self._model.top_cheese(dest_stool_index)
+                top_cheese = self.top_cheese(dest_stool_index)
                 if top_cheese is None:
                     self.select_platform_for_move(dest_stool, dest_stool_index)
                 else:
@@ -183,17 +243,125 @@ class GUIController:
                 self.show_number_of_moves()
             except IllegalMoveError as e:
                 print(e)
-                self._blinking = True
-                for i in range(10):
-                    self._cheese_to_move.highlight(i % 2 != 0)
-                    self.root.update()
-                    time.sleep(0.1)
-                self._blinking = False
+                self.blink(self._cheese_to_move)
             self._cheese_to_move.highlight(False)
             self._cheese_to_move = None
 
+    def blink(self: 'GUIController', cheese: CheeseView, times: int=10,
+              interval: int=100):
+        """
+        Blink cheese to show that it can't be moved there, switching its
+        highlight times times, interval milliseconds apart. Returns at once;
+        the blinking is done by the event loop.
+        """
+        self.stop_blinking()
+        self._blinking_cheese = cheese
+
+        def step(i: int):
+            if i < times:
+                cheese.highlight(i % 2 != 0)
+                self._effects.schedule('blink', interval,
+                                       lambda: step(i + 1))
+            else:
+                self.stop_blinking()
+
+        step(0)
+
+    def stop_blinking(self: 'GUIController'):
+        """Stop blinking the cheese that is blinking, if any."""
+        self._effects.cancel('blink')
+        if self._blinking_cheese is not None:
+            self._blinking_cheese.highlight(False)
+            self._blinking_cheese = None
+
+    def autoplay(self: 'GUIController', moves: 'MoveSequence/iterable',
+                 moves_per_second: float=None, frames_per_second: int=30):
+        """
+        Play moves, a MoveSequence or any iterable of (origin, destination)
+        stool pairs such as Tour.iter_four_stool_moves, starting from the
+        current position. Returns at once; the event loop makes the moves.
+        Clicks are ignored until all of moves are made or stop_autoplay is
+        called.
+
+        Many moves are made in each frame, and only the cheeses that ended
+        up somewhere new are redrawn, once per frame.
+
+        moves_per_second - how fast to make the moves, or None to make as
+                           many as fit in about half of each frame
+        frames_per_second - how often to redraw the cheeses
+        """
+        self.stop_autoplay()
+        self.stop_blinking()
+        if self._cheese_to_move is not None:
+            self._cheese_to_move.highlight(False)
+            self._cheese_to_move = None
+        self._autoplay_moves = iter(moves)
+        self._autoplay_rate = moves_per_second
+        self._autoplay_interval = max(1, round(1000 / frames_per_second))
+        self._autoplay_start = time.perf_counter()
+        self._autoplay_count = 0
+        self._effects.schedule('autoplay', self._autoplay_interval,
+                               self._autoplay_frame)
+
+    def _autoplay_frame(self: 'GUIController'):
+        """Make the moves due in this frame of autoplay, and redraw the
+        cheeses they moved."""
+        model = self._model
+        moves = self._autoplay_moves
+        now = time.perf_counter()
+        if self._autoplay_rate is None:
+            budget = None
+            deadline = now + self._autoplay_interval / 2000
+        else:
+            budget = (int((now - self._autoplay_start) * self._autoplay_rate)
+                      - self._autoplay_count)
+        # Maps the size of each cheese moved to its stool and its height on
+        # the stool, so a cheese moved many times this frame is placed once.
+        moved = {}
+        done = 0
+        finished = False
+        try:
+            while budget is None or done < budget:
+                move = next(moves, None)
+                if move is None:
+                    finished = True
+                    break
+                origin, destination = move
+                model.move(origin, destination)
+                size = model.top_cheese(destination).size
+                moved[size] = (destination,
+                               model.stool_height(destination) - 1)
+                done += 1
+                if (budget is None and not done % 256 and
+                        time.perf_counter() > deadline):
+                    break
+        except (IllegalMoveError, KeyError) as e:
+            print('Autoplay stopped by an illegal move:', e)
+            finished = True
+
+        for size, (stool_index, level) in moved.items():
+            stool = self._stools[stool_index]
+            y_center = stool.y_center - self.cheese_scale * (level + 1)
+            self._cheese_views[size].place(stool.x_center, y_center)
+        self._autoplay_count += done
+        self.show_number_of_moves()
+        elapsed = time.perf_counter() - self._autoplay_start
+        self.speed_label.config(text='Moves per second: ' +
+                                str(round(self._autoplay_count / elapsed)))
+
+        if finished:
+            self._autoplay_moves = None
+        else:
+            self._effects.schedule('autoplay', self._autoplay_interval,
+                                   self._autoplay_frame)
+
+    def stop_autoplay(self: 'GUIController'):
+        """Stop autoplay, leaving the moves already made."""
+        self._effects.cancel('autoplay')
+        self._autoplay_moves = None
+
     def stool_index(self: 'GUIView', stool: 'StoolView') -> int:
-        return self._stools.index(stool)
+        return stool.position
 
     def show_number_of_moves(self: 'GUIView'):
         """Show the number of moves so far."""
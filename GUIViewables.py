@@ -19,6 +19,9 @@
 PlatformView: A visible Cheese or stool, which a cheese can sit on top of.
 CheeseView: A visible Cheese object represented as a PlatformView.
 StoolView: A visible stool.
+EffectScheduler: Runs timed visual effects from the tkinter event loop.
+CanvasBatch: Changes to canvas rectangles, sent to tkinter together.
+ClickDispatcher: Reports clicks anywhere on a canvas to the clicked view.
 
 Each PlatformView instance receives a Canvas instance. The Canvas class is a 
 class in the tkinter framework. The class is used for a place in a window 
@@ -31,7 +34,16 @@ CheeseView objects can be moved and highlighted.
 Note that CheeseView inherits from both Cheese and PlatformView
 
 PlatformView objects receive a function to call in order to report to some
-UI object (e.g. GUIController) that their rectangle was clicked on.
+UI object (e.g. GUIController) that their rectangle was clicked on. Views
+registered with a ClickDispatcher share one binding on the whole canvas,
+instead of binding each rectangle to its own function.
+
+PlatformView objects may share a CanvasBatch, which saves up their moves
+and colour changes and sends them to Tcl in one script per frame, instead of
+one round trip each.
+
+EffectScheduler objects run callbacks after a delay using the after() timers
+of a tkinter widget, so effects such as blinking never block the window.
 """
 
 from TOAHModel import Cheese
@@ -39,14 +51,32 @@ from tkinter import Canvas
 from tkinter import Event
 
 
+# The attributes of every PlatformView. PlatformView itself declares no
+# slots so that CheeseView can also inherit the size slot of Cheese; its
+# subclasses declare these instead, which is why PlatformView is abstract.
+_PLATFORM_SLOTS = ('canvas', 'batch', '_width', 'x_center', 'y_center',
+                   'thickness', 'index')
+
+
 class PlatformView:
+    """An abstract visible platform: make a CheeseView or StoolView instead.
+
+    >>> PlatformView(10, None, None, 5, 0, 0)
+    Traceback (most recent call last):
+    ...
+    TypeError: PlatformView is abstract: make a CheeseView or StoolView
+    """
+
+    __slots__ = ()
     
     def __init__(self: 'PlatformView',
                  width: float,
                  click_handler: (lambda Event: None),
                  canvas: Canvas,
                  thickness: float,
-                 x_center: float, y_center: float):
+                 x_center: float, y_center: float,
+                 index: int=None, batch: 'CanvasBatch'=None,
+                 dispatcher: 'ClickDispatcher'=None):
         """
         Initialize a new PlatformView.
         
@@ -56,9 +86,20 @@ class PlatformView:
         thickness - vertical extent of this platform
         x_center - center of this platform horizontally
         y_center - center of this platform vertically
+        index - a rectangle already on canvas to use, or None to create one
+        batch - CanvasBatch to save changes to the rectangle in, or None to
+                make them right away
+        dispatcher - ClickDispatcher to report clicks through, or None to
+                     bind the rectangle itself
         """
 
+        # Without the slots of a subclass there is nowhere to keep the
+        # attributes below.
+        if type(self) is PlatformView:
+            raise TypeError('PlatformView is abstract: make a CheeseView or '
+                            'StoolView')
         self.canvas = canvas
+        self.batch = batch
         self._width = width
         self.x_center = x_center
         self.y_center = y_center
@@ -66,8 +107,9 @@ class PlatformView:
 
         # Create a rectangle on the canvas, and record the index that tkinter
         # uses to refer to it.
-        self.index = canvas.create_rectangle(0, 0, 0, 0)
-        self.canvas.itemconfigure(self.index)
+        if index is None:
+            index = canvas.create_rectangle(0, 0, 0, 0)
+        self.index = index
 
         # Initial placement.
         self.place(x_center, y_center)
@@ -75,9 +117,12 @@ class PlatformView:
         # Tell the canvas to report when the rectangle is clicked.
         # The report is a call to click_handler, passing it this CheeseView
         # instance so the controller knows which one was clicked.
-        canvas.tag_bind(self.index,
-                        '<ButtonRelease>',
-                        lambda _: click_handler(self))    
+        if dispatcher is None:
+            canvas.tag_bind(self.index,
+                            '<ButtonRelease>',
+                            lambda _: click_handler(self))
+        else:
+            dispatcher.register(self, click_handler)
         
     def place(self: 'PlatformView', x_center: float,
               y_center: float):
@@ -85,25 +130,63 @@ class PlatformView:
         Place rectangular image of this cheese/stool at (x_center, y_center)
         """
         # corners are half of size or thickness away
-    
-        self.canvas.coords(self.index,
-                           round(x_center - self._width / 2),
-                           round(y_center - self.thickness / 2),
-                           round(x_center + self._width / 2),
-                           round(y_center + self.thickness / 2))
+        corners = (round(x_center - self._width / 2),
+                   round(y_center - self.thickness / 2),
+                   round(x_center + self._width / 2),
+                   round(y_center + self.thickness / 2))
+        if self.batch is None:
+            self.canvas.coords(self.index, *corners)
+        else:
+            self.batch.coords(self.index, *corners)
         # record new center
         self.x_center = x_center
         self.y_center = y_center    
+
+    def resize(self: 'PlatformView', width: float):
+        """
+        Make the rectangular image of this cheese/stool width pixels wide,
+        keeping its center.
+        """
+        self._width = width
+        self.place(self.x_center, self.y_center)
+
+    def configure(self: 'PlatformView', **options):
+        """
+        Set canvas item options, such as fill, of the rectangular image of
+        this cheese/stool.
+        """
+        if self.batch is None:
+            self.canvas.itemconfigure(self.index, **options)
+        else:
+            self.batch.configure(self.index, **options)
+
+    def fill(self: 'PlatformView', colour: str):
+        """
+        Colour the rectangular image of this cheese/stool.
+        """
+        self.configure(fill=colour)
+
+    def show(self: 'PlatformView', showing: bool):
+        """
+        Show or hide the rectangular image of this cheese/stool. Hidden
+        rectangles can't be clicked.
+        """
+        self.configure(state=('normal' if showing else 'hidden'))
         
 
 class CheeseView(Cheese, PlatformView):
+
+    __slots__ = _PLATFORM_SLOTS
+
     def __init__(self: 'CheeseView',
                  size: int,
                  width: float,
                  click_handler: (lambda Event: None),
                  canvas: Canvas,
                  thickness: float,
-                 x_center: float, y_center: float):
+                 x_center: float, y_center: float,
+                 index: int=None, batch: 'CanvasBatch'=None,
+                 dispatcher: 'ClickDispatcher'=None):
         """
         Initialize a new CheeseView.
 
@@ -114,10 +197,11 @@ class CheeseView(Cheese, PlatformView):
         thickness - vertical extent of this cheese
         x_center - center of this cheese horizontally
         y_center - center of this cheese vertically
+        index, batch, dispatcher - as for PlatformView
         """
 
         PlatformView.__init__(self, width, click_handler, canvas, thickness, 
-                              x_center, y_center)
+                              x_center, y_center, index, batch, dispatcher)
         Cheese.__init__(self, size)
 
         # Initially unhighlighted.
@@ -128,20 +212,191 @@ class CheeseView(Cheese, PlatformView):
 
            highlighting - whether to highlight"""
 
-        self.canvas.itemconfigure(self.index,
-                                  fill=('red' if highlighting else 'orange'))
+        self.fill('red' if highlighting else 'orange')
 
         
 class StoolView(PlatformView):
+
+    __slots__ = _PLATFORM_SLOTS + ('position',)
     
     def __init__(self: 'StoolView',                 
                  width: float,
                  click_handler: (lambda Event: None),
                  canvas: Canvas,
                  thickness: float,
-                 x_center: float, y_center: float):
+                 x_center: float, y_center: float,
+                 position: int=0,
+                 index: int=None, batch: 'CanvasBatch'=None,
+                 dispatcher: 'ClickDispatcher'=None):
+        """
+        Initialize a new StoolView.
+
+        position - index of this stool in the game, counting from 0
+        index, batch, dispatcher - as for PlatformView
+        """
         
         PlatformView.__init__(self, width, 
                               click_handler, canvas, thickness, 
-                              x_center, y_center)
-        self.canvas.itemconfigure(self.index, fill='black')        
+                              x_center, y_center, index, batch, dispatcher)
+        self.position = position
+        self.fill('black')        
+
+
+class EffectScheduler:
+    """Timed visual effects for a window, run by its event loop.
+
+    Each effect has a key, and at most one callback is pending per key, so
+    asking for an effect that is already pending coalesces the two.
+
+    schedule - run a callback for a key after a delay
+    cancel - forget the pending callback for a key
+    is_pending - whether a callback is pending for a key
+    cancel_all - forget every pending callback
+    """
+
+    def __init__(self: 'EffectScheduler', widget: 'Misc'):
+        """
+        Initialize a new EffectScheduler.
+
+        widget - any tkinter widget of the window, whose after() timers
+                 are used
+        """
+        self._widget = widget
+        # Maps each key to the after() id of its pending callback.
+        self._pending = {}
+
+    def schedule(self: 'EffectScheduler', key: object, delay: int,
+                 callback: (lambda: None), replace: bool=True):
+        """
+        Run callback after delay milliseconds, unless it is cancelled first.
+
+        replace - if a callback is already pending for key, replace it with
+                  this one when True, or keep it and drop this one when
+                  False
+        """
+        if key in self._pending:
+            if not replace:
+                return
+            self._widget.after_cancel(self._pending.pop(key))
+
+        def run():
+            del self._pending[key]
+            callback()
+
+        self._pending[key] = self._widget.after(delay, run)
+
+    def cancel(self: 'EffectScheduler', key: object):
+        """Forget the pending callback for key, if there is one."""
+        if key in self._pending:
+            self._widget.after_cancel(self._pending.pop(key))
+
+    def is_pending(self: 'EffectScheduler', key: object) -> bool:
+        """Return whether a callback is pending for key."""
+        return key in self._pending
+
+    def cancel_all(self: 'EffectScheduler'):
+        """Forget every pending callback."""
+        for key in list(self._pending):
+            self.cancel(key)
+
+
+class CanvasBatch:
+    """Changes to the rectangles on a canvas, saved up and sent to Tcl as
+    a single script. Only the last change of each kind to a rectangle is
+    kept, so a cheese moved many times before a flush is moved once.
+
+    create_rectangles - create many rectangles at once
+    coords - save a move of a rectangle
+    configure - save option changes, such as its colour, of a rectangle
+    flush - send every saved change
+    """
+
+    def __init__(self: 'CanvasBatch', canvas: Canvas,
+                 scheduler: EffectScheduler=None):
+        """
+        Initialize a new CanvasBatch.
+
+        canvas - the canvas holding the rectangles
+        scheduler - if given, every change also makes sure a flush is
+                    scheduled for the next pass of the event loop, so at
+                    most one flush happens per frame
+        """
+        self.canvas = canvas
+        self._scheduler = scheduler
+        self._coords = {}
+        self._options = {}
+
+    def create_rectangles(self: 'CanvasBatch', count: int) -> list:
+        """Create count empty rectangles on the canvas, in one Tcl call, and
+        return their indices in the order they are stacked, bottom first.
+        """
+        script = ['set ids {}']
+        script.extend(['lappend ids [{} create rectangle 0 0 0 0]'.format(
+            self.canvas)] * count)
+        script.append('set ids')
+        result = self.canvas.tk.eval('\n'.join(script))
+        return [int(index) for index in self.canvas.tk.splitlist(result)]
+
+    def coords(self: 'CanvasBatch', index: int, x1: int, y1: int, x2: int,
+               y2: int):
+        """Save moving rectangle index to corners (x1, y1) and (x2, y2)."""
+        self._coords[index] = (x1, y1, x2, y2)
+        self._request_flush()
+
+    def configure(self: 'CanvasBatch', index: int, **options):
+        """Save setting canvas item options of rectangle index."""
+        self._options.setdefault(index, {}).update(options)
+        self._request_flush()
+
+    def _request_flush(self: 'CanvasBatch'):
+        """Make sure a flush is scheduled, if there is a scheduler."""
+        if self._scheduler is not None:
+            self._scheduler.schedule('flush', 0, self.flush, replace=False)
+
+    def flush(self: 'CanvasBatch'):
+        """Send every saved change to Tcl, as a single script."""
+        if not self._coords and not self._options:
+            return
+        script = []
+        for index, corners in self._coords.items():
+            script.append('{} coords {} {} {} {} {}'.format(
+                self.canvas, index, *corners))
+        for index, options in self._options.items():
+            script.append('{} itemconfigure {}'.format(self.canvas, index) +
+                          ''.join(' -{} {{{}}}'.format(option, value)
+                                  for option, value in options.items()))
+        self._coords.clear()
+        self._options.clear()
+        self.canvas.tk.eval('\n'.join(script))
+
+
+class ClickDispatcher:
+    """Reports mouse clicks on the rectangles of a canvas to the views that
+    drew them, using one binding on the whole canvas and a table from
+    rectangle index to view, instead of a binding per rectangle.
+
+    register - report clicks on a view's rectangle to a click handler
+    """
+
+    def __init__(self: 'ClickDispatcher', canvas: Canvas):
+        """
+        Initialize a new ClickDispatcher for the rectangles of canvas.
+        """
+        self.canvas = canvas
+        # Maps each rectangle index to its view and click handler.
+        self._handlers = {}
+        canvas.bind('<ButtonRelease>', self._clicked)
+
+    def register(self: 'ClickDispatcher', view: PlatformView,
+                 click_handler: (lambda Event: None)):
+        """Call click_handler(view) whenever the rectangle of view is
+        clicked."""
+        self._handlers[view.index] = (view, click_handler)
+
+    def _clicked(self: 'ClickDispatcher', event: Event):
+        """Report a click to the view whose rectangle is under the mouse,
+        if there is one."""
+        items = self.canvas.find_withtag('current')
+        if items and items[0] in self._handlers:
+            view, click_handler = self._handlers[items[0]]
+            click_handler(view)
@@ -0,0 +1,132 @@
+# Copyright 2013, 2014 Gary Baumgartner, Danny Heap, Dustin Wehr
+# Distributed under the terms of the GNU General Public License.
+#
+# This file is part of Assignment 1, CSC148, Winter 2014.
+#
+# This is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This file is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file.  If not, see <http://www.gnu.org/licenses/>.
+"""
+StrategyIndex: Group many MoveSequences by the same_strategy relation using
+a hash lookup per sequence instead of comparing every pair.
+strategy_fingerprint: 64-bit fingerprint that two move sequences share
+when they are the same strategy.
+"""
+
+from TOAHModel import (MoveSequence, IllegalMoveError, canonical_keys,
+                       mix_key)
+
+
+def strategy_fingerprint(moves: 'MoveSequence', number_of_stools: int,
+                         number_of_cheeses: int) -> int:
+    """Return a 64-bit fingerprint of moves, as played from the standard
+    start of a game with this many stools and cheeses, or None if some
+    move is illegal.
+
+    The fingerprint is a rolling hash of the canonical_key of every
+    configuration the game passes through, so it ignores which stool is
+    which, exactly like TOAHModel.same_strategy. Sequences that are the
+    same strategy always share a fingerprint, and others almost never do.
+
+    >>> f1 = strategy_fingerprint(MoveSequence([(0, 1), (0, 2), (1, 2)]),
+    ...                           4, 7)
+    >>> f2 = strategy_fingerprint(MoveSequence([(0, 3), (0, 2), (3, 2)]),
+    ...                           4, 7)
+    >>> f3 = strategy_fingerprint(MoveSequence([(0, 1), (0, 2), (1, 0)]),
+    ...                           4, 7)
+    >>> f1 == f2, f1 == f3
+    (True, False)
+    >>> strategy_fingerprint(MoveSequence([(1, 0)]), 4, 7) is None
+    True
+    """
+    fingerprint = mix_key((number_of_stools << 32) ^ number_of_cheeses)
+    try:
+        for key in canonical_keys(moves, number_of_stools,
+                                  number_of_cheeses):
+            fingerprint = mix_key(fingerprint * 31 + key)
+    except IllegalMoveError:
+        return None
+    return mix_key(fingerprint ^ moves.length())
+
+
+class StrategyIndex:
+    """An index of move sequences, grouped into clusters of sequences that
+    are all the same strategy.
+
+    add - fingerprint a sequence and file it under a label
+    matches - labels of the sequences already filed with the same strategy
+    clusters - every group of labels filed under the same strategy
+    """
+
+    def __init__(self: 'StrategyIndex'):
+        """
+        Initialize an empty StrategyIndex.
+        """
+        #Maps each fingerprint to the labels of its sequences, in the
+        #order they were added.
+        self._clusters = {}
+        self._added = 0
+
+    def add(self: 'StrategyIndex', moves: 'MoveSequence',
+            number_of_stools: int, number_of_cheeses: int,
+            label: object=None) -> int:
+        """File moves under label, which defaults to the number of
+        sequences added before it. Returns the fingerprint of moves, or
+        None if moves isn't legal, in which case it isn't filed, since an
+        illegal sequence isn't the same strategy as anything.
+
+        >>> index = StrategyIndex()
+        >>> a = index.add(MoveSequence([(0, 1), (0, 2), (1, 2)]), 4, 7, 'a')
+        >>> b = index.add(MoveSequence([(0, 3), (0, 2), (3, 2)]), 4, 7)
+        >>> c = index.add(MoveSequence([(0, 1), (0, 2), (1, 0)]), 4, 7, 'c')
+        >>> a == b, a == c
+        (True, False)
+        >>> index.clusters()
+        [['a', 1], ['c']]
+        """
+        fingerprint = strategy_fingerprint(moves, number_of_stools,
+                                           number_of_cheeses)
+        if label is None:
+            label = self._added
+        self._added += 1
+        if fingerprint is not None:
+            self._clusters.setdefault(fingerprint, []).append(label)
+        return fingerprint
+
+    def matches(self: 'StrategyIndex', moves: 'MoveSequence',
+                number_of_stools: int, number_of_cheeses: int) -> list:
+        """Return the labels of every filed sequence that is the same
+        strategy as moves, without filing moves.
+
+        >>> index = StrategyIndex()
+        >>> fingerprint = index.add(MoveSequence([(0, 1)]), 3, 2, 'a')
+        >>> index.matches(MoveSequence([(0, 2)]), 3, 2)
+        ['a']
+        """
+        fingerprint = strategy_fingerprint(moves, number_of_stools,
+                                           number_of_cheeses)
+        return list(self._clusters.get(fingerprint, []))
+
+    def clusters(self: 'StrategyIndex') -> list:
+        """Return a list of clusters, each a list of the labels of
+        sequences that are all the same strategy, in the order they were
+        first seen."""
+        return [list(labels) for labels in self._clusters.values()]
+
+    def __len__(self: 'StrategyIndex') -> int:
+        """Return the number of different strategies filed."""
+        return len(self._clusters)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -25,6 +25,43 @@ Towers of Anne Hoy game, and we will use that to check the correctness of your
 algorithm.
 """
 
+from array import array
+import mmap
+import struct
+import sys
+
+#State keys are 64-bit integers, and every sum of them wraps around.
+_MASK64 = (1 << 64) - 1
+
+#The running total of the cheese keys on a stool also counts the cheeses
+#on it, in its low _HEIGHT_BITS bits, so that a move keeps both up to date
+#with the same two additions.
+_HEIGHT_BITS = 32
+_HEIGHT_MASK = (1 << _HEIGHT_BITS) - 1
+
+
+def _mix64(value: int) -> int:
+    """Scramble value into a well spread 64-bit integer (the splitmix64
+    finaliser). The same value always gives the same result.
+
+    >>> _mix64(1) == _mix64(1), _mix64(1) == _mix64(2)
+    (True, False)
+    """
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+def mix_key(value: int) -> int:
+    """Return value scrambled into a well spread 64-bit key, for building
+    hashes out of state keys. Only value modulo 2 ** 64 matters.
+
+    >>> mix_key(1) == mix_key(1 + 2 ** 64), mix_key(1) == mix_key(2)
+    (True, False)
+    """
+    return _mix64(value)
+
 
 class TOAHModel:
     """Model a game of Towers Of Anne Hoy.
@@ -34,30 +71,77 @@ class TOAHModel:
 
     fill_first_stool - put an existing model in the standard starting config
     move - move cheese from one stool to another
+    apply_moves - make a whole MoveSequence of moves at once
     add - add a cheese to a stool
     cheese_location - index of the stool that the given cheese is on
     number_of_cheeses - number of cheeses in this game
+    stool_height - number of cheeses on a given stool
     number_of_moves - number of moves so far
     number_of_stools - number of stools in this game
     get_move_seq - MoveSequence object that records the moves used so far
+    copy - independent TOAHModel with the same cheeses and moves
+    state_key - 64-bit key that is equal for equal (==) models
+    canonical_key - 64-bit key that ignores the order of the stools
 
     """
 
-    def __init__(self: 'TOAHModel', number_of_stools: int):
+    def __init__(self: 'TOAHModel', number_of_stools: int,
+                 compact: bool=False):
         """
         Initialize a model of the Towers of Anne Hoi game.
 
+        compact - if True, keep only the flat integer arrays below, and
+                  no Cheese objects, which makes adding cheeses and
+                  copying states cheaper. top_cheese then returns a new
+                  Cheese of the right size.
+
         PRECONDITION: number_of_stools > 0
         """
         self._stoolnum = number_of_stools
+        #Packing the move sequence wide enough for every stool up front
+        #lets move append to it without checking.
         self._move_seq = MoveSequence([])
-        #I chose to use a dictionary of lists, as this allows us to
-        #easily move the cheese to a known stool while retaining
-        #the order of the cheeses. It is also prettier to deal with
-        #then a list of lists.
-        self._model = {}
-        for num in range(number_of_stools):
-            self._model[num] = []
+        self._move_seq._widen(max(number_of_stools - 1, 0))
+        self._filled_stool = False
+        self._renderer = None
+        #The stacks are kept in flat integer arrays, so that a move only
+        #changes a few numbers and lookups never scan the stools. They
+        #are lists, which CPython reads and writes several times faster
+        #than arrays:
+        #_locations[size] is the stool the cheese of that size is on, or
+        #_absent if there is no such cheese,
+        #_below[size] is the size of the cheese under it, or -1,
+        #_tops[stool] is the size of the cheese on top of stool, or -1.
+        #Unless compact, _cheeses[size] is the Cheese object of that size,
+        #so that top_cheese and _model hand back the cheeses that were
+        #added.
+        self._absent = 255 if number_of_stools < 255 else 65535
+        self._locations = []
+        self._below = []
+        self._tops = [-1] * number_of_stools
+        self._cheeses = None if compact else []
+        #A running total, kept up to date by _place, so that counting
+        #cheeses never has to look at the stools.
+        self._cheese_count = 0
+        #State keys. Each cheese has a random-looking key
+        #_cheese_keys[size], and each stool an odd factor. The state key
+        #sums cheese key * stool factor, so it depends on which stool each
+        #cheese is on. The canonical key sums a scrambled total of the
+        #cheese keys on each stool, which doesn't depend on the order of
+        #the stools at all. _place, move and apply_moves only keep the
+        #exact total of the keys on each stool, _stool_sums, up to date,
+        #which is two additions per move; the keys themselves are worked
+        #out from the totals, in O(number of stools), when asked for.
+        #Each total also holds the height of its stool in the low bits
+        #(see _HEIGHT_BITS), which is what stool_height returns.
+        #_stool_mixes[stool] is the scrambled total as of when the total
+        #was _mixed_sums[stool].
+        self._cheese_keys = []
+        self._stool_factors = [_mix64(stool) | 1
+                               for stool in range(number_of_stools)]
+        self._stool_sums = [0] * number_of_stools
+        self._mixed_sums = [0] * number_of_stools
+        self._stool_mixes = [_mix64(0)] * number_of_stools
 
     def fill_first_stool(self: 'TOAHModel', number_of_cheeses: int):
         """
@@ -76,7 +160,33 @@ class TOAHModel:
         #Iterates backwards to build from bottom to top.
         for cheese_size in range(number_of_cheeses, 0, -1):
             new_cheese = Cheese(cheese_size)
-            self._model[0].append(new_cheese)
+            self._place(0, new_cheese)
+
+    def _grow(self: 'TOAHModel', size: int):
+        """Make sure the size-indexed arrays have a slot for a cheese of the
+        given size.
+        """
+        missing = size + 1 - len(self._locations)
+        if missing > 0:
+            self._locations.extend([self._absent] * missing)
+            self._below.extend([-1] * missing)
+            if self._cheeses is not None:
+                self._cheeses.extend([None] * missing)
+            self._cheese_keys.extend([0] * missing)
+
+    def _place(self: 'TOAHModel', location: int, cheese: 'Cheese'):
+        """Put cheese on top of stool location, with no checks."""
+        size = cheese.size
+        self._grow(size)
+        self._locations[size] = location
+        self._below[size] = self._tops[location]
+        self._tops[location] = size
+        if self._cheeses is not None:
+            self._cheeses[size] = cheese
+        self._cheese_count += 1
+        key = (_mix64(size) << _HEIGHT_BITS) + 1
+        self._cheese_keys[size] = key
+        self._stool_sums[location] += key
 
     def add(self: "TOAHModel", location: int, cheese: "Cheese/CheeseView"):
         """ Puts a Cheese object at a specific location.
@@ -91,10 +201,16 @@ class TOAHModel:
         #This first part throws an exception if you try to set up cheeses
         #in a way that violates the game, i.e. you try to add a larger cheese
         #on a smaller cheese, or two cheeses of the same size.
-        if len(self._model[location]) > 0:
-            if self._model[location][-1].size <= cheese.size:
-                raise SillyUserError
-        self._model[location].append(cheese)
+        self._check_stool(location)
+        top = self._tops[location]
+        if top >= 0 and top <= cheese.size:
+            raise SillyUserError
+        if cheese.size < 0:
+            raise SillyUserError
+        if (cheese.size < len(self._locations) and
+                self._locations[cheese.size] != self._absent):
+            raise SillyUserError
+        self._place(location, cheese)
 
     def move(self: 'TOAHModel', location: int, destination: int):
         """ Moves the top cheese from location to destination as
@@ -110,27 +226,99 @@ class TOAHModel:
         >>> m._model
         {0: [Cheese(3), Cheese(2), Cheese(1)], 1: []}
         """
+        #A stool that doesn't exist is a KeyError, as if the stools were
+        #looked up in a dictionary. Only negative stools need checking
+        #first, since the others fall off the end of _tops.
+        if location < 0:
+            raise KeyError(location)
+        tops = self._tops
+        try:
+            size = tops[location]
+        except IndexError:
+            raise KeyError(location) from None
         #Makes sure that there is a cheese on the stool to move
-        if len(self._model[location]) > 0:
-            loc_size = self._model[location][-1].size
-        else:
+        if size < 0:
             raise IllegalMoveError
-
-        #Keeps track of the size of cheese on top of the destination stool.
-        #If there is nothing there, defaults to loc_size + 1 so a move is
-        #always possible
-        if len(self._model[destination]) > 0:
-            dest_size = self._model[destination][-1].size
-        else:
-            dest_size = loc_size + 1
-
-        if loc_size < dest_size:
-            cheese = self._model[location].pop()
-            self._model[destination].append(cheese)
-            #updates our move sequence
-            self._move_seq.add_move(location, destination)
-        else:
+        if destination < 0:
+            raise KeyError(destination)
+        try:
+            dest_size = tops[destination]
+        except IndexError:
+            raise KeyError(destination) from None
+        #The top of the destination has to be empty or bigger. It is
+        #only ever the same size when location and destination are equal.
+        if 0 <= dest_size <= size:
             raise IllegalMoveError
+        below = self._below
+        tops[location] = below[size]
+        below[size] = dest_size
+        tops[destination] = size
+        self._locations[size] = destination
+        #Only the two stools involved change their key totals and
+        #heights.
+        key = self._cheese_keys[size]
+        sums = self._stool_sums
+        sums[location] -= key
+        sums[destination] += key
+        #updates our move sequence, which is already wide enough for both
+        #stools
+        seq = self._move_seq
+        seq._moves.append((location << seq._bits) | destination)
+
+    def apply_moves(self: 'TOAHModel', moves: 'MoveSequence',
+                    validate: bool=True) -> int:
+        """Make every move in moves, in order, and record them all in this
+        model's move sequence in one go. Returns None if every move was
+        made, or else the index of the first illegal move, which is left
+        unmade along with everything after it.
+
+        validate - if False, skip the legality checks. Only do this for
+                   moves already known to be legal, since an illegal one
+                   leaves the model in a broken state.
+
+        >>> m = TOAHModel(3, compact=True)
+        >>> m.fill_first_stool(2)
+        >>> m.apply_moves(MoveSequence([(0, 1), (0, 2), (1, 2)]))
+        >>> m.stool_height(2), m.number_of_moves()
+        (2, 3)
+        >>> m.apply_moves(MoveSequence([(2, 0), (2, 0), (0, 1)]))
+        1
+        >>> m.get_move_seq()
+        MoveSequence([(0, 1), (0, 2), (1, 2), (2, 0)])
+        """
+        if not isinstance(moves, MoveSequence):
+            moves = MoveSequence(moves)
+        #Pull everything the loop touches into locals, and leave the
+        #move sequence for a single update at the end.
+        tops = self._tops
+        below = self._below
+        locations = self._locations
+        keys = self._cheese_keys
+        sums = self._stool_sums
+        stools = self._stoolnum
+        applied = 0
+        try:
+            for location, destination in moves:
+                if validate and not (0 <= location < stools and
+                                     0 <= destination < stools):
+                    break
+                size = tops[location]
+                dest_size = tops[destination]
+                if validate and (size < 0 or 0 <= dest_size <= size):
+                    break
+                tops[location] = below[size]
+                below[size] = dest_size
+                tops[destination] = size
+                locations[size] = destination
+                key = keys[size]
+                sums[location] -= key
+                sums[destination] += key
+                applied += 1
+        finally:
+            self._move_seq.extend(moves[:applied])
+        if applied < moves.length():
+            return applied
+        return None
 
     def cheese_location(self: "TOAHModel", cheese: "Cheese/CheeseView") -> int:
         """Returns index of stool where cheese object is located.
@@ -139,9 +327,15 @@ class TOAHModel:
         >>> m.fill_first_stool(1)
         >>> m.cheese_location(m._model[0][0])
         0
+        >>> m2 = TOAHModel(3, compact=True)
+        >>> m2.fill_first_stool(2)
+        >>> m2.move(0, 2)
+        >>> m2.cheese_location(Cheese(1)), m2.cheese_location(Cheese(2))
+        (2, 0)
         """
-        for stool in self._model:
-            if cheese in self._model[stool]:
+        if 0 <= cheese.size < len(self._locations):
+            stool = self._locations[cheese.size]
+            if stool != self._absent:
                 return stool
         #In case someone decides to call it when there is no matching cheese
         raise SillyUserError
@@ -154,10 +348,13 @@ class TOAHModel:
         >>> m.top_cheese(0)
         Cheese(1)
         """
-        if len(self._model[stool_index]) > 0:
-            return self._model[stool_index][-1]
-        else:
+        self._check_stool(stool_index)
+        size = self._tops[stool_index]
+        if size < 0:
             return None
+        if self._cheeses is not None:
+            return self._cheeses[size]
+        return Cheese(size)
 
     def number_of_cheeses(self: 'TOAHModel') -> int:
         """Returns the number of cheeses in the current game.
@@ -167,8 +364,24 @@ class TOAHModel:
         m.number_of_cheeses()
         7
         """
-        #pretty simple, just counts every stool and adds it up
-        return sum([len(self._model[stool]) for stool in self._model])
+        return self._cheese_count
+
+    def stool_height(self: 'TOAHModel', stool_index: int) -> int:
+        """Returns the number of cheeses on the stool at stool_index.
+
+        >>> m = TOAHModel(3)
+        >>> m.fill_first_stool(4)
+        >>> m.move(0, 2)
+        >>> m.stool_height(0), m.stool_height(1), m.stool_height(2)
+        (3, 0, 1)
+        >>> m = TOAHModel(3, compact=True)
+        >>> m.fill_first_stool(4)
+        >>> m.apply_moves(MoveSequence([(0, 1), (0, 2)]))
+        >>> m.stool_height(0), m.stool_height(1), m.stool_height(2)
+        (2, 1, 1)
+        """
+        self._check_stool(stool_index)
+        return self._stool_sums[stool_index] & _HEIGHT_MASK
 
     def number_of_moves(self: 'TOAHModel') -> int:
         """Returns the number of moves made in the current game.
@@ -193,6 +406,54 @@ class TOAHModel:
         """
         return self._stoolnum
 
+    def _check_stool(self: 'TOAHModel', stool_index: int):
+        """Raise KeyError if there is no stool stool_index, as looking it
+        up in a dictionary of stools would."""
+        if not 0 <= stool_index < self._stoolnum:
+            raise KeyError(stool_index)
+
+    def _stool_sizes(self: 'TOAHModel', stool_index: int) -> list:
+        """Return the sizes of the cheeses on stool stool_index, from the
+        bottom up.
+
+        >>> m = TOAHModel(2, compact=True)
+        >>> m.fill_first_stool(3)
+        >>> m._stool_sizes(0)
+        [3, 2, 1]
+        """
+        sizes = []
+        size = self._tops[stool_index]
+        while size >= 0:
+            sizes.append(size)
+            size = self._below[size]
+        sizes.reverse()
+        return sizes
+
+    def _stool_cheeses(self: 'TOAHModel', stool_index: int) -> list:
+        """Return the cheeses on stool stool_index, from the bottom up:
+        the ones that were added, or new ones of the right sizes if this
+        model is compact."""
+        if self._cheeses is None:
+            return [Cheese(size) for size in self._stool_sizes(stool_index)]
+        return [self._cheeses[size] for size in self._stool_sizes(stool_index)]
+
+    @property
+    def _model(self: 'TOAHModel') -> dict:
+        """The stools as a dictionary of lists of cheeses, from the bottom
+        up, built from the flat arrays each time it is asked for.
+
+        >>> m = TOAHModel(2)
+        >>> m.fill_first_stool(2)
+        >>> m._model
+        {0: [Cheese(2), Cheese(1)], 1: []}
+        """
+        #I chose to use a dictionary of lists, as this allows us to
+        #easily move the cheese to a known stool while retaining
+        #the order of the cheeses. It is also prettier to deal with
+        #then a list of lists.
+        return {stool: self._stool_cheeses(stool)
+                for stool in range(self._stoolnum)}
+
     def _cheese_at(self: 'TOAHModel', stool_index,
                    stool_height: int) -> 'Cheese':
         """
@@ -207,15 +468,99 @@ class TOAHModel:
         >>> M._cheese_at(0,0).size
         5
         """
+        if stool_height >= self.stool_height(stool_index):
+            return None
+        stool = self._stool_cheeses(stool_index)
         #Lucky for us, len() can get us the number of cheeses on
         #a particular stool easily. So we just need to make sure
         #that number is strictly greater than stool_height
         #(since stool_height begins at 0)
-        if len(self._model[stool_index]) > stool_height:
-            return self._model[stool_index][stool_height]
+        if len(stool) > stool_height:
+            return stool[stool_height]
         else:
             return None
 
+    def copy(self: 'TOAHModel') -> 'TOAHModel':
+        """Return a new TOAHModel, using the same backend, with the same
+        cheeses on the same stools and the same moves so far.
+
+        >>> m1 = TOAHModel(3, compact=True)
+        >>> m1.fill_first_stool(2)
+        >>> m2 = m1.copy()
+        >>> m2.move(0, 1)
+        >>> m1 == m2, m1.number_of_moves(), m2.number_of_moves()
+        (False, 0, 1)
+        """
+        other = TOAHModel.__new__(TOAHModel)
+        other.__dict__.update(self.__dict__)
+        other._below = list(self._below)
+        other._tops = list(self._tops)
+        if self._cheeses is not None:
+            other._cheeses = list(self._cheeses)
+        other._locations = list(self._locations)
+        other._cheese_keys = list(self._cheese_keys)
+        other._stool_sums = list(self._stool_sums)
+        other._mixed_sums = list(self._mixed_sums)
+        other._stool_mixes = list(self._stool_mixes)
+        other._move_seq = MoveSequence(self._move_seq)
+        other._renderer = None
+        return other
+
+    def state_key(self: 'TOAHModel') -> int:
+        """Return a 64-bit key for the current configuration. Models that
+        are == always have the same key, and different configurations
+        almost never do.
+
+        >>> m1 = TOAHModel(3)
+        >>> m1.fill_first_stool(3)
+        >>> m2 = m1.copy()
+        >>> m1.move(0, 1)
+        >>> m1.state_key() == m2.state_key()
+        False
+        >>> m1.move(1, 0)
+        >>> m1.state_key() == m2.state_key()
+        True
+        >>> m3 = TOAHModel(3, compact=True)
+        >>> m3.fill_first_stool(3)
+        >>> m3.apply_moves(MoveSequence([(0, 2), (2, 1)]))
+        >>> m1.move(0, 1)
+        >>> m3.state_key() == m1.state_key()
+        True
+        """
+        #Summing key * factor over the cheeses is the same as summing
+        #total * factor over the stools.
+        return sum(factor * (total >> _HEIGHT_BITS) for factor, total in
+                   zip(self._stool_factors, self._stool_sums)) & _MASK64
+
+    def canonical_key(self: 'TOAHModel') -> int:
+        """Return a 64-bit key for the current configuration that ignores
+        the order of the stools, so models that are equivalent_models
+        always have the same key, and others almost never do.
+
+        >>> m1 = TOAHModel(3)
+        >>> m1.fill_first_stool(3)
+        >>> m2 = m1.copy()
+        >>> m1.move(0, 1)
+        >>> m2.move(0, 2)
+        >>> m1.canonical_key() == m2.canonical_key()
+        True
+        >>> m1.state_key() == m2.state_key()
+        False
+        """
+        #Only scramble the totals of stools that changed since last time.
+        sums = self._stool_sums
+        mixed = self._mixed_sums
+        mixes = self._stool_mixes
+        for stool in range(self._stoolnum):
+            if sums[stool] != mixed[stool]:
+                mixed[stool] = sums[stool]
+                mixes[stool] = _mix64((sums[stool] >> _HEIGHT_BITS) &
+                                      _MASK64)
+        return sum(mixes) & _MASK64
+
+    def __hash__(self: 'TOAHModel') -> int:
+        return self.state_key()
+
     def get_move_seq(self: 'TOAHModel') -> 'MoveSequence':
         """
         Returns the MoveSequence that represents all moves made
@@ -259,13 +604,16 @@ class TOAHModel:
                 self._stoolnum != other._stoolnum):
             return False
 
-        #This block then checks if the stools have the same configuration
-        #of cheeses.
-        for stool in self._model:
-            if stool in other._model:
-                if self._model[stool] != other._model[stool]:
-                    return False
-        return True
+        #Since stacks are always sorted by size, the stools match exactly
+        #when every cheese is on the same stool, and that is a single
+        #array comparison. Slots past the end of the shorter array must
+        #all be empty.
+        short, long = self._locations, other._locations
+        if len(short) > len(long):
+            short, long = long, short
+        extra = long[len(short):]
+        return (short == long[:len(short)] and
+                extra.count(self._absent) == len(extra))
 
     def equivalent_models(self: 'TOAHModel', other: 'TOAHModel') -> bool:
         """
@@ -286,50 +634,36 @@ class TOAHModel:
         False
         """
         #First tests the number of cheeses, since that is the easiest way
-        #to tell if they outright don't match
-        if self.number_of_cheeses() != other.number_of_cheeses():
+        #to tell if they outright don't match. Equivalent models always
+        #have the same canonical key, so different keys settle it too.
+        if (self.number_of_cheeses() != other.number_of_cheeses() or
+                self.canonical_key() != other.canonical_key()):
             return False
 
-        #This block determines if all stacks are the same, and is guaranteed
-        #to be right given that they have the same number of cheeses.
-        values_self = self._model.values()
-        values_other = other._model.values()
-
-        for value in values_self:
-            if value not in values_other:
-                return False
+        #Stacks can only match if the stool heights match in some order.
+        if (sorted(self.stool_height(stool)
+                   for stool in range(self._stoolnum)) !=
+                sorted(other.stool_height(stool)
+                       for stool in range(other._stoolnum))):
+            return False
 
-        return True
+        #This block determines if all stacks are the same, by sorting the
+        #stacks of both so that the order of the stools doesn't matter.
+        stacks_self = sorted(self._stool_sizes(stool)
+                             for stool in range(self._stoolnum))
+        stacks_other = sorted(other._stool_sizes(stool)
+                              for stool in range(other._stoolnum))
+        return stacks_self == stacks_other
 
     def __str__(self: 'TOAHModel') -> str:
         """
         Depicts only the current state of the stools and cheese.
         """
-        stool_str = "=" * (2 * (self.number_of_cheeses()) + 1)
-        stool_spacing = "  "
-        stools_str = (stool_str + stool_spacing) * self.number_of_stools()
-
-        def cheese_str(size: int):
-            if size == 0:
-                return " " * len(stool_str)
-            cheese_part = "-" + "--" * (size - 1)
-            space_filler = " " * int((len(stool_str) - len(cheese_part)) / 2)
-            return space_filler + cheese_part + space_filler
-
-        lines = ""
-        for height in range(self.number_of_cheeses() - 1, -1, -1):
-            line = ""
-            for stool in range(self.number_of_stools()):
-                c = self._cheese_at(stool, height)
-                if isinstance(c, Cheese):
-                    s = cheese_str(int(c.size))
-                else:
-                    s = cheese_str(0)
-                line += s + stool_spacing
-            lines += line + "\n"
-        lines += stools_str
-
-        return lines
+        #The renderer keeps the picture between calls and only redraws
+        #the cheeses moved since, which keeps console animation cheap.
+        if self._renderer is None:
+            self._renderer = TOAHRenderer(self)
+        return self._renderer.render()
 
     def same_strategy(self: 'TOAHModel', other: 'TOAHModel') -> bool:
         """
@@ -365,10 +699,14 @@ class TOAHModel:
         >>> m2.move(0,3)
         >>> m1.same_strategy(m2)
         True
+        >>> m3 = TOAHModel(4)
+        >>> for size in range(7, 0, -1):
+        ...     m3.add(0, Cheese(size))
+        >>> m3.same_strategy(m3.copy())
+        False
         """
         #checks first condition
-        if self._filled_stool != other._filled_stool:
-            print("failed1")
+        if not (self._filled_stool and other._filled_stool):
             return False
 
         #checks second condition
@@ -378,33 +716,211 @@ class TOAHModel:
             return False
 
         #checks third condition and fourth condition simultaneously
-        test1 = TOAHModel(self.number_of_stools())
-        test2 = TOAHModel(other.number_of_stools())
-        test1.fill_first_stool(self.number_of_cheeses())
-        test2.fill_first_stool(other.number_of_cheeses())
-        move_seq1 = self.get_move_seq()
-        move_seq2 = other.get_move_seq()
-
-        for move in range(move_seq1.length()):
-            try:
-                loc1 = move_seq1.get_move(move)[0]
-                dest1 = move_seq1.get_move(move)[1]
-                loc2 = move_seq2.get_move(move)[0]
-                dest2 = move_seq2.get_move(move)[1]
-
-                test1.move(loc1, dest1)
-                test2.move(loc2, dest2)
-            except IllegalMoveError:
-                #This is the test of condition three
-                return False
-            if not test1.equivalent_models(test2):
-                #This is the test of condition four
-                return False
+        return _same_strategy_moves(self.get_move_seq(), other.get_move_seq(),
+                                    self.number_of_stools(),
+                                    self.number_of_cheeses())
 
-        return True
+
+class TOAHRenderer:
+    """The text picture of a TOAHModel, kept between calls so that drawing
+    it again after a few moves only redraws the cheeses that moved.
+
+    render - the picture of the model as it is now
+    lines - the rows of that picture, top to bottom
+    """
+
+    def __init__(self: 'TOAHRenderer', model: 'TOAHModel'):
+        """
+        Initialize a renderer that draws model.
+        """
+        self._model = model
+        self._rebuild()
+
+    def _rebuild(self: 'TOAHRenderer'):
+        """Draw the picture from scratch."""
+        model = self._model
+        number_of_cheeses = model.number_of_cheeses()
+        stool_str = "=" * (2 * number_of_cheeses + 1)
+        stool_spacing = "  "
+        #Every cell the picture can contain, already padded and spaced:
+        #_cells[0] is an empty spot and _cells[size] the cheese of size.
+        cells = [" " * len(stool_str) + stool_spacing]
+        for size in range(1, len(model._locations)):
+            cheese_part = "-" + "--" * (size - 1)
+            space_filler = " " * int((len(stool_str) - len(cheese_part)) / 2)
+            cells.append(space_filler + cheese_part + space_filler +
+                         stool_spacing)
+        self._cells = cells
+        self._base = (stool_str + stool_spacing) * model.number_of_stools()
+        #_grid[height][stool] is the cell drawn at that height of stool.
+        self._grid = [[cells[0]] * model.number_of_stools()
+                      for height in range(number_of_cheeses)]
+        self._heights = [0] * model.number_of_stools()
+        for stool in range(model.number_of_stools()):
+            for size in model._stool_sizes(stool):
+                self._grid[self._heights[stool]][stool] = cells[size]
+                self._heights[stool] += 1
+        self._rows = [None] * number_of_cheeses
+        self._cheese_count = number_of_cheeses
+        self._seen = model.number_of_moves()
+
+    def _catch_up(self: 'TOAHRenderer'):
+        """Bring the picture up to date with the model, moving one cell
+        per move made since the last render."""
+        model = self._model
+        moves = model.get_move_seq()
+        count = moves.length()
+        #Redrawing costs one cell per cheese, so replay only while that
+        #is cheaper, and start over if cheeses were added meanwhile.
+        if (model.number_of_cheeses() != self._cheese_count or
+                count < self._seen or
+                count - self._seen > self._cheese_count):
+            self._rebuild()
+            return
+        grid, rows, heights = self._grid, self._rows, self._heights
+        blank = self._cells[0]
+        for i in range(self._seen, count):
+            src_stool, dest_stool = moves.get_move(i)
+            heights[src_stool] -= 1
+            src_row = grid[heights[src_stool]]
+            dest_row = grid[heights[dest_stool]]
+            dest_row[dest_stool] = src_row[src_stool]
+            src_row[src_stool] = blank
+            rows[heights[src_stool]] = None
+            rows[heights[dest_stool]] = None
+            heights[dest_stool] += 1
+        self._seen = count
+        if heights != [model.stool_height(stool)
+                       for stool in range(model.number_of_stools())]:
+            self._rebuild()
+
+    def lines(self: 'TOAHRenderer') -> list:
+        """Return the rows of the picture of the model, top to bottom,
+        ending with the stools. A row that hasn't changed since the last
+        call is the very same string object as before.
+
+        >>> m = TOAHModel(3)
+        >>> m.fill_first_stool(2)
+        >>> renderer = TOAHRenderer(m)
+        >>> before = renderer.lines()
+        >>> m.move(0, 1)
+        >>> after = renderer.lines()
+        >>> [b is a for b, a in zip(before, after)]
+        [False, False, True]
+        """
+        self._catch_up()
+        grid, rows = self._grid, self._rows
+        for height in range(len(rows)):
+            if rows[height] is None:
+                rows[height] = "".join(grid[height])
+        return rows[::-1] + [self._base]
+
+    def render(self: 'TOAHRenderer') -> str:
+        """Return the picture of the model as it is now."""
+        return "\n".join(self.lines())
+
+
+def canonical_keys(moves: 'MoveSequence', number_of_stools: int,
+                   number_of_cheeses: int):
+    """Yield the canonical_key of a game started with fill_first_stool
+    after each of moves, in order, raising IllegalMoveError at the first
+    illegal move. Works in O(1) per move without recording the moves, so
+    moves can be as long as a memory-mapped MoveSequence allows.
+
+    >>> m = TOAHModel(3)
+    >>> m.fill_first_stool(2)
+    >>> m.move(0, 1)
+    >>> list(canonical_keys(MoveSequence([(0, 1)]), 3, 2)) == [
+    ...     m.canonical_key()]
+    True
+    """
+    #Borrow the starting arrays and keys from a scratch model.
+    model = TOAHModel(number_of_stools, compact=True)
+    model.fill_first_stool(number_of_cheeses)
+    tops = model._tops
+    below = model._below
+    keys = model._cheese_keys
+    canonical = model.canonical_key()
+    sums = model._stool_sums
+    mixes = model._stool_mixes
+    for location, destination in moves:
+        if not (0 <= location < number_of_stools and
+                0 <= destination < number_of_stools):
+            raise IllegalMoveError
+        size = tops[location]
+        dest_size = tops[destination]
+        if size < 0 or 0 <= dest_size <= size:
+            raise IllegalMoveError
+        tops[location] = below[size]
+        below[size] = dest_size
+        tops[destination] = size
+        key = keys[size]
+        sums[location] -= key
+        sums[destination] += key
+        loc_mix = _mix64((sums[location] >> _HEIGHT_BITS) & _MASK64)
+        dest_mix = _mix64((sums[destination] >> _HEIGHT_BITS) & _MASK64)
+        canonical = ((canonical + loc_mix + dest_mix - mixes[location] -
+                      mixes[destination]) & _MASK64)
+        mixes[location] = loc_mix
+        mixes[destination] = dest_mix
+        yield canonical
+
+
+def _same_strategy_moves(moves1: 'MoveSequence', moves2: 'MoveSequence',
+                         number_of_stools: int,
+                         number_of_cheeses: int) -> bool:
+    """Return whether two move sequences of the same standard game are the
+    same strategy, in the sense of TOAHModel.same_strategy."""
+    if moves1.length() != moves2.length():
+        return False
+    keys1 = canonical_keys(moves1, number_of_stools, number_of_cheeses)
+    keys2 = canonical_keys(moves2, number_of_stools, number_of_cheeses)
+    try:
+        for key1, key2 in zip(keys1, keys2):
+            if key1 != key2:
+                return False
+    except IllegalMoveError:
+        return False
+    return True
+
+
+def same_strategy_logs(path1: str, path2: str) -> bool:
+    """Return whether the move logs saved by MoveSequence.save at path1 and
+    path2 are the same strategy, in the sense of TOAHModel.same_strategy.
+    Both logs must record their game size, and are streamed through memory
+    maps rather than read in.
+
+    >>> import os, tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> MoveSequence([(0, 1), (0, 2), (1, 2)]).save(
+    ...     os.path.join(directory, 'a'), 4, 7)
+    >>> MoveSequence([(0, 3), (0, 2), (3, 2)]).save(
+    ...     os.path.join(directory, 'b'), 4, 7)
+    >>> same_strategy_logs(os.path.join(directory, 'a'),
+    ...                    os.path.join(directory, 'b'))
+    True
+    """
+    header1 = MoveSequence.read_header(path1)
+    header2 = MoveSequence.read_header(path2)
+    if header1 != header2:
+        return False
+    number_of_stools, number_of_cheeses, _ = header1
+    if number_of_stools == 0 or number_of_cheeses == 0:
+        raise SillyUserError
+    moves1 = MoveSequence.open(path1)
+    moves2 = MoveSequence.open(path2)
+    try:
+        return _same_strategy_moves(moves1, moves2, number_of_stools,
+                                    number_of_cheeses)
+    finally:
+        moves1.close()
+        moves2.close()
 
 
 class Cheese:
+
+    __slots__ = ('size',)
+
     def __init__(self: 'Cheese', size: int):
         """
         Initialize a Cheese to diameter size.
@@ -437,21 +953,262 @@ class SillyUserError(Exception):
     pass
 
 
+#MoveSequence packs each move into one array item, with the source stool
+#in the high half of its bits and the destination stool in the low half.
+#Storage starts at one byte per move and only widens when a stool index
+#no longer fits. Entries are (typecode, bits per stool). One byte moves
+#are kept in a bytearray, which appends several times faster than an
+#array('B').
+_MOVE_CODES = [('B', 4), ('H', 8),
+               ('I' if array('I').itemsize >= 4 else 'L', 16)]
+
+
+def _packed(typecode: str, codes: 'iterable'=()) -> 'array/bytearray':
+    """Return new storage for move codes of typecode, holding codes.
+
+    >>> _packed('B', [1, 2]), _packed('H', [1, 2])
+    (bytearray(b'\\x01\\x02'), array('H', [1, 2]))
+    """
+    if typecode == 'B':
+        return bytearray(codes)
+    return array(typecode, codes)
+
+#Decoded moves for every possible one byte move code.
+_BYTE_MOVES = [(code >> 4, code & 15) for code in range(256)]
+
+#Move log files start with this header: magic, format version, bits per
+#stool, number of stools, number of cheeses and number of moves, all
+#little-endian. The packed moves follow, also little-endian. The header
+#size is a multiple of 4 so the body can be viewed as an array in place.
+_LOG_MAGIC = b'TOAH'
+_LOG_VERSION = 1
+_LOG_HEADER = struct.Struct('<4sBBxxIIQ')
+
+
 class MoveSequence(object):
     def __init__(self: 'MoveSequence', moves: list):
-        # moves - a list of integer pairs, e.g. [(0,1),(0,2),(1,2)]
-        self._moves = moves
+        # moves - a list of integer pairs, e.g. [(0,1),(0,2),(1,2)], or
+        # any iterable of them such as a generator from Tour
+        self._moves = bytearray()
+        self._bits = 4
+        self.extend(moves)
+
+    def _writable(self: 'MoveSequence'):
+        """Copy moves that are still mapped from a file into memory, so
+        they can be added to."""
+        if isinstance(self._moves, memoryview):
+            self._moves = _packed(self._moves.format, self._moves)
+
+    def _widen(self: 'MoveSequence', stool: int):
+        """Switch to the narrowest packing that can hold stool, re-packing
+        the moves recorded so far.
+
+        >>> m = MoveSequence([(0, 1)])
+        >>> m._widen(300)
+        >>> m._moves.typecode == _MOVE_CODES[2][0], m.get_move(0)
+        (True, (0, 1))
+        """
+        if stool < 0:
+            raise ValueError('stool index ' + str(stool) + ' is negative')
+        for typecode, bits in _MOVE_CODES:
+            if stool < 1 << bits:
+                break
+        else:
+            raise ValueError('stool index ' + str(stool) + ' is too large')
+        if bits > self._bits:
+            moves = array(typecode)
+            moves.extend(((code >> self._bits) << bits) |
+                         (code & ((1 << self._bits) - 1))
+                         for code in self._moves)
+            self._moves = moves
+            self._bits = bits
 
     def get_move(self: 'MoveSequence', i: int):
         # Exception if not (0 <= i < self.length)
-        return self._moves[i]
+        code = self._moves[i]
+        return (code >> self._bits, code & ((1 << self._bits) - 1))
 
     def add_move(self: 'MoveSequence', src_stool: int, dest_stool: int):
-        self._moves.append((src_stool, dest_stool))
+        for stool in (src_stool, dest_stool):
+            if not 0 <= stool < 1 << self._bits:
+                self._widen(stool)
+        self._writable()
+        self._moves.append((src_stool << self._bits) | dest_stool)
+
+    def extend(self: 'MoveSequence', moves: 'iterable'):
+        """Append every (src_stool, dest_stool) pair in moves, which may be
+        a generator that is consumed lazily. Another MoveSequence is
+        appended in bulk, without unpacking its moves.
+
+        >>> m = MoveSequence([(0, 1)])
+        >>> m.extend(iter([(1, 2), (0, 1)]))
+        >>> m.extend(MoveSequence([(2, 0)]))
+        >>> m
+        MoveSequence([(0, 1), (1, 2), (0, 1), (2, 0)])
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'wide.toah')
+        >>> MoveSequence([(0, 19), (0, 1)]).save(path, 20, 2)
+        >>> log = MoveSequence.open(path)
+        >>> m.extend(log)
+        >>> m[-2:], MoveSequence(log)
+        (MoveSequence([(0, 19), (0, 1)]), MoveSequence([(0, 19), (0, 1)]))
+        >>> log.close()
+        """
+        if isinstance(moves, MoveSequence):
+            if moves._bits > self._bits:
+                self._widen((1 << moves._bits) - 1)
+            if moves._bits == self._bits:
+                self._append_packed(moves._moves)
+                return
+        add_move = self.add_move
+        for move in moves:
+            add_move(move[0], move[1])
+
+    def _append_packed(self: 'MoveSequence', codes: 'buffer'):
+        """Append codes, any buffer of moves already packed the way this
+        sequence packs them, in bulk."""
+        self._writable()
+        if isinstance(self._moves, bytearray):
+            self._moves += codes
+        else:
+            self._moves.frombytes(memoryview(codes).cast('B'))
 
     def length(self: 'MoveSequence') -> int:
         return len(self._moves)
 
+    def __len__(self: 'MoveSequence') -> int:
+        return len(self._moves)
+
+    def __getitem__(self: 'MoveSequence', i: 'int/slice'):
+        """Return move i, or a new MoveSequence when i is a slice.
+
+        >>> m = MoveSequence([(0, 1), (0, 2), (1, 2)])
+        >>> m[1]
+        (0, 2)
+        >>> m[1:]
+        MoveSequence([(0, 2), (1, 2)])
+        """
+        if isinstance(i, slice):
+            sliced = MoveSequence([])
+            sliced._moves = self._moves[i]
+            sliced._bits = self._bits
+            return sliced
+        return self.get_move(i)
+
+    def __iter__(self: 'MoveSequence'):
+        if self._bits == 4:
+            byte_moves = _BYTE_MOVES
+            return (byte_moves[code] for code in self._moves)
+        bits = self._bits
+        mask = (1 << bits) - 1
+        return ((code >> bits, code & mask) for code in self._moves)
+
+    def save(self: 'MoveSequence', path: str, number_of_stools: int=0,
+             number_of_cheeses: int=0):
+        """Write this sequence to path as a binary move log, recording the
+        size of the game it belongs to (0 if unknown) in the header.
+
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'tour.toah')
+        >>> MoveSequence([(0, 2), (0, 1), (2, 1)]).save(path, 3, 2)
+        >>> MoveSequence.read_header(path)
+        (3, 2, 3)
+        >>> m = MoveSequence.open(path)
+        >>> m
+        MoveSequence([(0, 2), (0, 1), (2, 1)])
+        >>> m.close()
+        """
+        moves = self._moves
+        if sys.byteorder == 'big' and self._bits > _MOVE_CODES[0][1]:
+            moves = array(moves.format if not isinstance(moves, array)
+                          else moves.typecode, moves)
+            moves.byteswap()
+        with open(path, 'wb') as log:
+            log.write(_LOG_HEADER.pack(_LOG_MAGIC, _LOG_VERSION, self._bits,
+                                       number_of_stools, number_of_cheeses,
+                                       len(moves)))
+            log.write(moves)
+
+    @staticmethod
+    def read_header(path: str) -> tuple:
+        """Return (number_of_stools, number_of_cheeses, number_of_moves)
+        from the header of the move log at path."""
+        return MoveSequence._read_header(path)[1:]
+
+    @staticmethod
+    def _read_header(path: str) -> tuple:
+        """Return (bits per stool, number_of_stools, number_of_cheeses,
+        number_of_moves) from the header of the move log at path."""
+        with open(path, 'rb') as log:
+            header = log.read(_LOG_HEADER.size)
+        if len(header) < _LOG_HEADER.size:
+            raise ValueError(path + ' is not a move log')
+        magic, version, bits, stools, cheeses, count = _LOG_HEADER.unpack(
+            header)
+        if magic != _LOG_MAGIC or version != _LOG_VERSION:
+            raise ValueError(path + ' is not a move log')
+        return (bits, stools, cheeses, count)
+
+    @classmethod
+    def open(cls, path: str) -> 'MoveSequence':
+        """Return the MoveSequence saved at path. The file is memory-mapped
+        rather than read, so get_move and iteration work directly on the
+        file, however large it is. Adding moves copies it into memory.
+        Raises ValueError if the file is not a whole move log.
+
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'tour.toah')
+        >>> MoveSequence([(0, 2), (0, 1), (2, 1)]).save(path, 3, 2)
+        >>> m = MoveSequence.open(path)
+        >>> m.add_move(1, 0)
+        >>> m.close()
+        >>> m
+        MoveSequence([(0, 2), (0, 1), (2, 1), (1, 0)])
+        >>> os.truncate(path, os.path.getsize(path) - 1)
+        >>> MoveSequence.open(path)  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+        ...
+        ValueError: ... is shorter than its header says
+        """
+        bits, stools, cheeses, count = cls._read_header(path)
+        typecodes = [code for code, size in _MOVE_CODES if size == bits]
+        if not typecodes:
+            raise ValueError(path + ' has moves of an unknown width')
+        typecode = typecodes[0]
+        itemsize = array(typecode).itemsize
+        end = _LOG_HEADER.size + count * itemsize
+        with open(path, 'rb') as log:
+            mapped = mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mapped) < end:
+            mapped.close()
+            raise ValueError(path + ' is shorter than its header says')
+        body = memoryview(mapped)[_LOG_HEADER.size:end]
+        seq = cls([])
+        seq._bits = bits
+        seq._mmap = mapped
+        seq._moves = body.cast(typecode)
+        if sys.byteorder == 'big' and itemsize > 1:
+            seq._moves = array(typecode, seq._moves)
+            seq._moves.byteswap()
+        return seq
+
+    def close(self: 'MoveSequence'):
+        """Release the file behind a sequence made by MoveSequence.open.
+        Unless moves were added since, which copies the sequence into
+        memory, it is empty afterwards. Slices taken from it share the
+        mapping, and keep the file open until they are discarded."""
+        mapped = getattr(self, '_mmap', None)
+        if mapped is not None:
+            if isinstance(self._moves, memoryview):
+                self._moves.release()
+                self._moves = bytearray()
+                self._bits = _MOVE_CODES[0][1]
+            self._mmap = None
+            try:
+                mapped.close()
+            except BufferError:
+                pass
+
     def generate_TOAHModel(self: 'MoveSequence', number_of_stools: int,
                            number_of_cheeses: int) -> 'TOAHModel':
         """
@@ -462,12 +1219,12 @@ class MoveSequence(object):
         """
         model = TOAHModel(number_of_stools)
         model.fill_first_stool(number_of_cheeses)
-        for move in self._moves:
-            model.move(move[0], move[1])
+        if model.apply_moves(self) is not None:
+            raise IllegalMoveError
         return model
 
     def __repr__(self: 'MoveSequence') -> str:
-        return "MoveSequence(" + repr(self._moves) + ")"
+        return "MoveSequence(" + repr(list(self)) + ")"
 
 
 if __name__ == '__main__':
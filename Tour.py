@@ -15,14 +15,105 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this file.  If not, see <http://www.gnu.org/licenses/>.
-from ConsoleController import ConsoleController
+from ConsoleController import ConsoleController, ConsoleAnimator
 from GUIController import GUIController
-from TOAHModel import TOAHModel, MoveSequence
+from TOAHModel import TOAHModel, MoveSequence, Cheese, SillyUserError
 
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import heapq
+import os
 import time
 
 
-def minimum(num_cheeses: int, depth: int=0) -> int:
+#Frame-Stewart split tables, one per number of stools, shared by every
+#call. For k stools, _split_tables[k][0][n] is the fewest moves for n
+#cheeses and _split_tables[k][1][n] is the i that achieves it.
+_split_tables = {}
+
+
+def _split_table(stools: int, n: int) -> tuple:
+    """Return the (moves, splits) table for stools stools, grown so it
+    covers every number of cheeses up to n.
+
+    >>> _split_table(4, 6)[1][:7]
+    [0, 1, 1, 2, 3, 3, 3]
+    >>> _split_table(3, 4)[0][:5]
+    [0, 1, 3, 7, 15]
+    """
+    if stools < 3:
+        raise SillyUserError
+    if stools not in _split_tables:
+        _split_tables[stools] = ([0, 1], [0, 1])
+    moves, split = _split_tables[stools]
+    if len(moves) > n:
+        return moves, split
+    if stools == 3:
+        #With three stools we always move all but the bottom cheese out
+        #of the way, so the table has a closed form.
+        for cheeses in range(len(moves), n + 1):
+            moves.append(2 ** cheeses - 1)
+            split.append(1)
+        return moves, split
+    smaller = _split_table(stools - 1, n)[0]
+    for cheeses in range(len(moves), n + 1):
+        #The cost 2 * moves[cheeses - i] + smaller[i] is convex in i, and
+        #its best i never shrinks as cheeses grows, so we only have to walk
+        #forward from the previous best i. Ties go to the larger i.
+        i = split[cheeses - 1]
+        best = 2 * moves[cheeses - i] + smaller[i]
+        while i + 1 < cheeses:
+            cost = 2 * moves[cheeses - i - 1] + smaller[i + 1]
+            if cost > best:
+                break
+            best = cost
+            i += 1
+        moves.append(best)
+        split.append(i)
+    return moves, split
+
+
+def optimal_split(n: int, stools: int=4) -> int:
+    """Return the number of cheeses i that Frame-Stewart moves with one
+    less stool when solving n cheeses on the given number of stools.
+
+    >>> optimal_split(6)
+    3
+    >>> optimal_split(10)
+    4
+    >>> optimal_split(10, 5)
+    6
+    >>> optimal_split(0)
+    0
+    """
+    if n <= 0:
+        return 0
+    return _split_table(stools, n)[1][n]
+
+
+def optimal_move_count(n: int, stools: int=4) -> int:
+    """Return the number of moves Frame-Stewart uses to move n cheeses
+    across the given number of stools.
+
+    >>> optimal_move_count(3)
+    5
+    >>> optimal_move_count(10)
+    49
+    >>> optimal_move_count(10, 3)
+    1023
+    >>> optimal_move_count(10, 5)
+    31
+    >>> optimal_move_count(0)
+    0
+    """
+    #A single cheese takes one move, however few stools there are.
+    if n <= 1:
+        return max(n, 0)
+    return _split_table(stools, n)[0][n]
+
+
+def minimum(num_cheeses: int) -> int:
     """Takes a number of cheeses, and returns the i that generated
     the minimum amount of moves according to the Frame-Stewart algorithm.
 
@@ -35,23 +126,7 @@ def minimum(num_cheeses: int, depth: int=0) -> int:
     >>> minimum(-2)
     0
     """
-    depth += 1
-    if num_cheeses == 1:
-        return 1
-    lowest = 0
-    right_i = 0
-    for i in range(1, num_cheeses):
-        moves = (2 * minimum(num_cheeses - i, depth)) + (2 ** i) - 1
-        if moves <= lowest or lowest == 0:
-            lowest = moves
-            right_i = i
-    #This part returns i ONLY if we are on the shallowest recursive
-    #depth, so we can use it recursively to get the lowest i and
-    #at the same time use it easily for our intended purpose.
-    if depth == 1:
-        return right_i
-    else:
-        return lowest
+    return optimal_split(num_cheeses)
 
 
 def three_stool_solution(movelist: 'MoveSequence', n: int,
@@ -96,9 +171,9 @@ def four_stool_solution(movelist: 'MoveSequence', n: int, location: int,
     if n == 1:
         movelist.add_move(location, destination)
     else:
-        #Minimum tells us exactly which i to choose without having
-        #brute force the moves.
-        i = minimum(n)
+        #The split table tells us exactly which i to choose without
+        #having to brute force the moves.
+        i = optimal_split(n)
         #n-i cheeses to mid 2
         four_stool_solution(movelist, n - i,
                             location, mid1, destination, mid2)
@@ -110,8 +185,372 @@ def four_stool_solution(movelist: 'MoveSequence', n: int, location: int,
                             mid1, location, destination)
 
 
+def k_stool_solution(movelist: 'MoveSequence', n: int, stools: list):
+    """Appends to our movelist the moves required to move n cheeses from
+    stools[0] to stools[-1], using every stool in between as spare room.
+
+    >>> move = MoveSequence([])
+    >>> k_stool_solution(move, 3, [0, 1, 2, 3])
+    >>> move
+    MoveSequence([(0, 2), (0, 1), (0, 3), (1, 3), (2, 3)])
+    >>> move2 = MoveSequence([])
+    >>> k_stool_solution(move2, 3, [0, 1, 2])
+    >>> move2
+    MoveSequence([(0, 2), (0, 1), (2, 1), (0, 2), (1, 0), (1, 2), (0, 2)])
+    >>> move3 = MoveSequence([])
+    >>> k_stool_solution(move3, 5, [0, 1, 2, 3, 4])
+    >>> move3.length() == optimal_move_count(5, 5)
+    True
+    """
+    if n == 1:
+        movelist.add_move(stools[0], stools[-1])
+    elif n > 1:
+        i = optimal_split(n, len(stools))
+        source = stools[0]
+        spares = list(stools[1:-2])
+        park = stools[-2]
+        destination = stools[-1]
+        #n-i cheeses to the last spare stool, using all of the stools
+        k_stool_solution(movelist, n - i,
+                         [source] + spares + [destination, park])
+        #i cheeses to destination without touching the parked cheeses
+        k_stool_solution(movelist, i, [source] + spares + [destination])
+        #n-i cheeses from the parked stool on top of them
+        k_stool_solution(movelist, n - i,
+                         [park] + spares + [source, destination])
+
+
+def iter_k_stool_moves(n: int, stools: list):
+    """Yield, one at a time, the moves k_stool_solution would append for
+    n cheeses on stools. Uses an explicit stack instead of recursion, so
+    only O(n) pending subproblems are held at once.
+
+    >>> list(iter_k_stool_moves(3, [0, 1, 2, 3]))
+    [(0, 2), (0, 1), (0, 3), (1, 3), (2, 3)]
+    >>> list(iter_k_stool_moves(0, [0, 1, 2]))
+    []
+    """
+    stack = [(n, tuple(stools))]
+    while stack:
+        n, stools = stack.pop()
+        if n == 1:
+            yield (stools[0], stools[-1])
+        elif n > 1:
+            i = optimal_split(n, len(stools))
+            source = stools[0]
+            spares = stools[1:-2]
+            park = stools[-2]
+            destination = stools[-1]
+            #Pushed in reverse, since the last one pushed runs first.
+            stack.append((n - i, (park,) + spares + (source, destination)))
+            stack.append((i, (source,) + spares + (destination,)))
+            stack.append((n - i, (source,) + spares + (destination, park)))
+
+
+def iter_three_stool_moves(n: int, loc: int, mid: int, dest: int):
+    """Yield the moves of three_stool_solution one at a time.
+
+    >>> list(iter_three_stool_moves(2, 4, 6, 15))
+    [(4, 6), (4, 15), (6, 15)]
+    """
+    return iter_k_stool_moves(n, (loc, mid, dest))
+
+
+def iter_four_stool_moves(n: int, location: int, mid1: int, mid2: int,
+                          destination: int):
+    """Yield the moves of four_stool_solution one at a time.
+
+    >>> list(iter_four_stool_moves(2, 5, 6, 7, 8))
+    [(5, 7), (5, 8), (7, 8)]
+    """
+    return iter_k_stool_moves(n, (location, mid1, mid2, destination))
+
+
+def _split_subtours(n: int, stools: tuple) -> list:
+    """Return the three (number of cheeses, stools) subtours that the
+    Frame-Stewart tour of n > 1 cheeses on stools is made of, in order.
+
+    >>> _split_subtours(3, (0, 1, 2, 3))
+    [(1, (0, 1, 3, 2)), (2, (0, 1, 3)), (1, (2, 1, 0, 3))]
+    """
+    i = optimal_split(n, len(stools))
+    source = stools[0]
+    spares = stools[1:-2]
+    park = stools[-2]
+    destination = stools[-1]
+    return [(n - i, (source,) + spares + (destination, park)),
+            (i, (source,) + spares + (destination,)),
+            (n - i, (park,) + spares + (source, destination))]
+
+
+def tour_move(n: int, index: int, stools: int=4) -> tuple:
+    """Return move number index (counting from 0) of the Frame-Stewart
+    tour of n cheeses from the first to the last of stools stools,
+    without generating any of the moves before it.
+
+    >>> tour_move(3, 2)
+    (0, 3)
+    >>> tour_move(3, 5, 3)
+    (1, 2)
+    >>> moves = list(iter_four_stool_moves(25, 0, 1, 2, 3))
+    >>> tour_move(25, 500) == moves[500]
+    True
+    """
+    if not 0 <= index < optimal_move_count(n, stools):
+        raise IndexError('tour has no move ' + str(index))
+    stools = tuple(range(stools))
+    #Walk down the recursion, skipping over whole subtours whose sizes
+    #we already know from the split table.
+    while n > 1:
+        for sub_n, sub_stools in _split_subtours(n, stools):
+            size = optimal_move_count(sub_n, len(sub_stools))
+            if index < size:
+                n, stools = sub_n, sub_stools
+                break
+            index -= size
+    return (stools[0], stools[-1])
+
+
+def tour_state(n: int, index: int, stools: int=4) -> list:
+    """Return the stool each cheese is on after the first index moves of
+    the Frame-Stewart tour of n cheeses across stools stools. Entry s - 1
+    is the stool holding the cheese of size s.
+
+    >>> tour_state(3, 2)
+    [2, 1, 0]
+    >>> tour_state(3, 5)
+    [3, 3, 3]
+    >>> tour_state(4, 7, 3)
+    [1, 1, 1, 0]
+    """
+    if not 0 <= index <= optimal_move_count(n, stools):
+        raise IndexError('tour has no move ' + str(index))
+    locations = [0] * n
+    stools = tuple(range(stools))
+    #base is the number of smaller cheeses that are not part of the
+    #subtour we are currently looking at.
+    base = 0
+    while n > 0:
+        if index == 0 or index == optimal_move_count(n, len(stools)):
+            stool = stools[0] if index == 0 else stools[-1]
+            for size in range(base + 1, base + n + 1):
+                locations[size - 1] = stool
+            break
+        (small, first), (large, middle), (_, last) = _split_subtours(
+            n, stools)
+        first_size = optimal_move_count(small, len(first))
+        middle_size = optimal_move_count(large, len(middle))
+        if index < first_size:
+            #The large cheeses have not left the source yet.
+            for size in range(base + small + 1, base + n + 1):
+                locations[size - 1] = stools[0]
+            n, stools = small, first
+        elif index < first_size + middle_size:
+            #The small cheeses are parked while the large ones move.
+            for size in range(base + 1, base + small + 1):
+                locations[size - 1] = first[-1]
+            index -= first_size
+            base += small
+            n, stools = large, middle
+        else:
+            #The large cheeses are done, and the small ones follow.
+            for size in range(base + small + 1, base + n + 1):
+                locations[size - 1] = stools[-1]
+            index -= first_size + middle_size
+            n, stools = small, last
+    return locations
+
+
+def tour_model(n: int, index: int, stools: int=4,
+               compact: bool=False) -> 'TOAHModel':
+    """Return a TOAHModel in the configuration reached after the first
+    index moves of the Frame-Stewart tour of n cheeses across stools
+    stools. The model's own move sequence starts out empty, and compact
+    picks its backend as in TOAHModel.
+
+    >>> m = tour_model(3, 2)
+    >>> m.top_cheese(0), m.top_cheese(1), m.top_cheese(2)
+    (Cheese(3), Cheese(2), Cheese(1))
+    """
+    model = TOAHModel(stools, compact)
+    locations = tour_state(n, index, stools)
+    for size in range(n, 0, -1):
+        model.add(locations[size - 1], Cheese(size))
+    return model
+
+
+def _validate_chunk(job: tuple) -> bool:
+    """Check one chunk of a tour for validate_tour, in a worker process.
+
+    job is (n, stools, start, moves): moves is the chunk of the tour that
+    begins at move number start. The chunk passes if its moves are all
+    legal from the tour's state at start, and end in the tour's state at
+    start + moves.length().
+    """
+    n, stools, start, moves = job
+    model = tour_model(n, start, stools, compact=True)
+    if model.apply_moves(moves) is not None:
+        return False
+    return model == tour_model(n, start + moves.length(), stools,
+                               compact=True)
+
+
+def _validate_sequentially(moves: 'MoveSequence', n: int,
+                           stools: int) -> bool:
+    """Replay moves from the standard start, and check they are legal and
+    leave all n cheeses on the last stool."""
+    model = TOAHModel(stools, compact=True)
+    model.fill_first_stool(n)
+    return (model.apply_moves(moves, validate=True) is None and
+            model.stool_height(stools - 1) == n)
+
+
+def validate_tour(moves: 'MoveSequence', n: int, stools: int=4,
+                  workers: int=None, chunks: int=None) -> bool:
+    """Return whether moves legally takes n cheeses from the first of
+    stools stools to the last.
+
+    Tours the same length as the Frame-Stewart tour are split into chunks
+    that are checked in parallel, each worker starting from the state
+    tour_state reconstructs for its chunk. If any chunk strays from the
+    Frame-Stewart tour, the whole sequence is checked again in order, so
+    other legal tours are still accepted, just not in parallel.
+
+    workers - number of worker processes, by default one per CPU
+    chunks - number of chunks, by default four per worker
+
+    >>> moves = MoveSequence(iter_four_stool_moves(8, 0, 1, 2, 3))
+    >>> validate_tour(moves, 8, workers=2)
+    True
+    >>> validate_tour(moves[:-1], 8, workers=2)
+    False
+    >>> validate_tour(MoveSequence([(0, 1), (0, 2), (1, 2)]), 2, 3)
+    True
+    """
+    length = moves.length()
+    if length != optimal_move_count(n, stools) or length == 0:
+        return _validate_sequentially(moves, n, stools)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunks is None:
+        chunks = workers * 4
+    chunks = max(1, min(chunks, length))
+    bounds = [length * part // chunks for part in range(chunks + 1)]
+    jobs = [(n, stools, bounds[part],
+             MoveSequence(moves[bounds[part]:bounds[part + 1]]))
+            for part in range(chunks)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if all(pool.map(_validate_chunk, jobs)):
+            return True
+    return _validate_sequentially(moves, n, stools)
+
+
+def _generate_chunk(job: tuple):
+    """Write one subtour into the shared move buffer for parallel_tour, in
+    a worker process.
+
+    job is (buffer name, typecode, bits, n, stools, offset): the moves of
+    the n cheese subtour on stools are packed like MoveSequence packs them
+    and written into the buffer starting at move number offset within it.
+    """
+    name, typecode, bits, n, stools, offset = job
+    buffer = shared_memory.SharedMemory(name=name)
+    view = buffer.buf.cast(typecode)
+    batch = array(typecode)
+    for src, dest in iter_k_stool_moves(n, stools):
+        batch.append((src << bits) | dest)
+        if len(batch) == 65536:
+            view[offset:offset + len(batch)] = batch
+            offset += len(batch)
+            batch = array(typecode)
+    view[offset:offset + len(batch)] = batch
+    view.release()
+    buffer.close()
+
+
+def parallel_tour(n: int, stools: int=4, workers: int=None) -> 'MoveSequence':
+    """Return the Frame-Stewart tour of n cheeses from the first to the
+    last of stools stools as a MoveSequence, generated by a pool of worker
+    processes.
+
+    The three subtours of a tour are independent once we know how many
+    moves each takes, so the tour is split into subtours until there is
+    enough work to share out, and each worker writes its packed moves
+    straight into a shared buffer at the subtour's offset. The buffer only
+    holds a sixteenth of the tour, so the subtours are generated in rounds,
+    each copied into place in the MoveSequence before the next, and the
+    tour is never held twice.
+
+    workers - number of worker processes, by default one per CPU
+
+    >>> moves = parallel_tour(10, 4, workers=2)
+    >>> list(moves) == list(iter_four_stool_moves(10, 0, 1, 2, 3))
+    True
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    total = optimal_move_count(n, stools)
+    moves = MoveSequence([])
+    if workers < 2 or total < 65536:
+        moves.extend(iter_k_stool_moves(n, range(stools)))
+        return moves
+    #Let the MoveSequence pick the packing it would use for these stools.
+    moves._widen(stools - 1)
+    packing = memoryview(moves._moves)
+    typecode = packing.format
+    itemsize = packing.itemsize
+    packing.release()
+
+    #Keep splitting the biggest subtour until every worker has a few, and
+    #every worker can have one in each round.
+    window = max(65536, -(-total // 16))
+    largest = max(4096, window // workers)
+    tasks = [(-total, 0, n, tuple(range(stools)))]
+    while -tasks[0][0] > largest or (len(tasks) < workers * 4 and
+                                     -tasks[0][0] >= 65536):
+        _, offset, sub_n, sub_stools = heapq.heappop(tasks)
+        for part_n, part_stools in _split_subtours(sub_n, sub_stools):
+            size = optimal_move_count(part_n, len(part_stools))
+            if size > 0:
+                heapq.heappush(tasks, (-size, offset, part_n, part_stools))
+            offset += size
+    tasks.sort(key=lambda task: task[1])
+
+    #Lay out the whole tour up front, so that each round is copied into
+    #place rather than appended.
+    moves.add_move(0, 0)
+    moves._moves *= total
+    target = memoryview(moves._moves).cast('B')
+    buffer = shared_memory.SharedMemory(create=True, size=window * itemsize)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            first = 0
+            while first < len(tasks):
+                #A round is as many of the next subtours as fit the buffer.
+                base = tasks[first][1]
+                last = first
+                while (last < len(tasks) and
+                       tasks[last][1] - tasks[last][0] - base <= window):
+                    last += 1
+                jobs = [(buffer.name, typecode, moves._bits, task_n,
+                         task_stools, offset - base)
+                        for _, offset, task_n, task_stools
+                        in tasks[first:last]]
+                list(pool.map(_generate_chunk, jobs))
+                end = tasks[last - 1][1] - tasks[last - 1][0]
+                target[base * itemsize:end * itemsize] = (
+                    buffer.buf[:(end - base) * itemsize])
+                first = last
+    finally:
+        target.release()
+        buffer.close()
+        buffer.unlink()
+    return moves
+
+
 def tour_of_four_stools(model: TOAHModel, delay_btw_moves: float=0.5,
-                        console_animate: bool=False):
+                        console_animate: bool=False,
+                        animation_fps: float=None):
     """Move a tower of cheeses from the first stool in model to the fourth.
 
        model - a TOAHModel with a tower of cheese on the first stool
@@ -120,23 +559,43 @@ def tour_of_four_stools(model: TOAHModel, delay_btw_moves: float=0.5,
        delay_btw_moves - time delay between moves in seconds IF
                          console_animate == True
                          no effect if console_animate == False
+       animation_fps - most frames to draw per second IF
+                       console_animate == True. When moves come faster
+                       than this, frames are skipped and the moves in
+                       between are shown together. None draws every move.
     """
 
-    #This first part is to make the right MoveSequence
+    #The moves are generated lazily, so the whole tour is never held
+    #in memory at once.
     cheese_num = model.number_of_cheeses()
-    moves = MoveSequence([])
-    four_stool_solution(moves, cheese_num, 0, 1, 2, 3)
+    moves = iter_four_stool_moves(cheese_num, 0, 1, 2, 3)
 
     #Then we apply it to our existing model, animating with delay if
     #requested.
     if console_animate:
-        for move in moves._moves:
-            print(model)
-            model.move(move[0], move[1])
-            time.sleep(delay_btw_moves)
-        print(model)
+        animator = ConsoleAnimator(model)
+        frame_time = 1 / animation_fps if animation_fps else 0
+        start = time.perf_counter()
+        next_frame = start
+        try:
+            animator.draw()
+            for count, move in enumerate(moves, 1):
+                model.move(move[0], move[1])
+                #Move number count is due at start + count * delay. Skip
+                #its frame if it is due before the next frame, unless the
+                #next frame is already late.
+                due = start + count * delay_btw_moves
+                now = time.perf_counter()
+                if due < next_frame and now < next_frame:
+                    continue
+                if due > now:
+                    time.sleep(due - now)
+                animator.draw()
+                next_frame = max(due, now) + frame_time
+        finally:
+            animator.finish()
     else:
-        for move in moves._moves:
+        for move in moves:
             model.move(move[0], move[1])
 
 if __name__ == '__main__':